@@ -1,6 +1,12 @@
-import operator
+import functools
+import math
+import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import warnings
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numba as nb
+import numpy as np
 
 try:
     import pyteomics.cmass as pmass
@@ -27,6 +33,38 @@ _aa_mass = {
     "X": 0,
 }
 
+# Amino acid masses indexed by their ASCII code, with a mask to indicate which
+# amino acids have a known mass.
+_aa_mass_lut = np.zeros(128, dtype=np.float64)
+_aa_mass_mask = np.zeros(128, dtype=np.bool_)
+for _aa, _mass in _aa_mass.items():
+    _aa_mass_lut[ord(_aa)] = _mass
+    _aa_mass_mask[ord(_aa)] = True
+
+# Immonium ions and their m/z (amino acid mass minus CO plus charge 1).
+_immonium_mass_diff = pmass.calculate_mass(
+    formula="CO"
+) - pmass.calculate_mass(formula="H")
+_immonium_ions = [
+    (f"I{aa}", mass - _immonium_mass_diff)
+    for aa, mass in _aa_mass.items()
+    if aa != "X"
+]
+
+# Peptide fragment ion types and their mass offsets relative to the summed
+# residue masses.
+_peptide_ion_types = "abcxyz"
+_peptide_ion_offset = np.asarray(
+    [
+        pmass.calculate_mass(formula="H2O")
+        + pmass.calculate_mass(composition=pmass.std_ion_comp[ion_type])
+        for ion_type in _peptide_ion_types
+    ],
+    dtype=np.float64,
+)
+
+_proton_mass = pmass.nist_mass["H+"][0][0]
+
 # Common neutral losses.
 _neutral_loss = {
     # No neutral loss.
@@ -61,8 +99,55 @@ _neutral_loss = {
 
 _supported_ions = "?abcxyzIm_prf"
 
+# Bit flags of the ion types for which fragments can be generated.
+_ion_bits = {
+    "a": 1,
+    "b": 2,
+    "c": 4,
+    "x": 8,
+    "y": 16,
+    "z": 32,
+    "I": 64,
+    "m": 128,
+    "p": 256,
+}
+
+# Default adduct, which is omitted from the fragment annotation string.
+_default_adduct_regex = re.compile(r"\[M\+\d+H\]")
+
+# Maximum number of cached theoretical fragment results. The default is small
+# to bound the memory use when generating fragments for many unique
+# proteoforms. The cache size can be changed (or caching disabled by using 0)
+# with the SPECTRUM_UTILS_FRAGMENT_CACHE_SIZE environment variable.
+_fragment_cache_size = 256
+try:
+    _fragment_cache_size = max(
+        int(
+            os.environ.get(
+                "SPECTRUM_UTILS_FRAGMENT_CACHE_SIZE", _fragment_cache_size
+            )
+        ),
+        0,
+    )
+except ValueError:
+    warnings.warn(
+        "Invalid SPECTRUM_UTILS_FRAGMENT_CACHE_SIZE value, using the default "
+        f"fragment cache size ({_fragment_cache_size})"
+    )
+
 
 class FragmentAnnotation:
+    __slots__ = (
+        "_ion_type",
+        "_neutral_loss",
+        "_isotope",
+        "_charge",
+        "_adduct",
+        "_analyte_number",
+        "_mz_delta",
+        "_str",
+    )
+
     def __init__(
         self,
         ion_type: str,
@@ -138,14 +223,63 @@ class FragmentAnnotation:
             raise ValueError(
                 "Unknown ions should not contain additional information"
             )
-        self.ion_type = ion_type
-        self.neutral_loss = neutral_loss
-        self.isotope = isotope
+        # Cached string representation, which is reset when any of the
+        # fields is modified.
+        self._str = None
+        # Only the charge and the m/z delta setters perform validation.
+        self._ion_type = ion_type
+        self._neutral_loss = neutral_loss
+        self._isotope = isotope
         self.charge = charge
-        self.adduct = f"[M+{self.charge}H]" if adduct is None else adduct
-        self.analyte_number = analyte_number
+        self._adduct = f"[M+{charge}H]" if adduct is None else adduct
+        self._analyte_number = analyte_number
         self.mz_delta = mz_delta
 
+    @property
+    def ion_type(self) -> str:
+        return self._ion_type
+
+    @ion_type.setter
+    def ion_type(self, ion_type: str):
+        self._ion_type = ion_type
+        self._str = None
+
+    @property
+    def neutral_loss(self) -> Optional[str]:
+        return self._neutral_loss
+
+    @neutral_loss.setter
+    def neutral_loss(self, neutral_loss: Optional[str]):
+        self._neutral_loss = neutral_loss
+        self._str = None
+
+    @property
+    def isotope(self) -> int:
+        return self._isotope
+
+    @isotope.setter
+    def isotope(self, isotope: int):
+        self._isotope = isotope
+        self._str = None
+
+    @property
+    def adduct(self) -> str:
+        return self._adduct
+
+    @adduct.setter
+    def adduct(self, adduct: str):
+        self._adduct = adduct
+        self._str = None
+
+    @property
+    def analyte_number(self) -> Optional[int]:
+        return self._analyte_number
+
+    @analyte_number.setter
+    def analyte_number(self, analyte_number: Optional[int]):
+        self._analyte_number = analyte_number
+        self._str = None
+
     @property
     def mz_delta(self) -> Optional[Tuple[float, str]]:
         return self._mz_delta
@@ -157,6 +291,7 @@ class FragmentAnnotation:
                 "The m/z delta must be specified in Dalton or ppm units"
             )
         self._mz_delta = mz_delta
+        self._str = None
 
     @property
     def charge(self) -> Optional[int]:
@@ -172,11 +307,17 @@ class FragmentAnnotation:
                 "ion types"
             )
         self._charge = charge
+        self._str = None
 
     def __repr__(self):
         return str(self)
 
     def __str__(self) -> str:
+        if self._str is None:
+            self._str = self._to_str()
+        return self._str
+
+    def _to_str(self) -> str:
         if self.ion_type == "?":
             return "?"
         else:
@@ -192,7 +333,7 @@ class FragmentAnnotation:
                 annot_str.append(f"{self.isotope:+}i")
             if self.charge is not None and self.charge > 1:
                 annot_str.append(f"^{self.charge}")
-            if re.match(r"\[M\+\d+H\]", self.adduct) is None:
+            if _default_adduct_regex.match(self.adduct) is None:
                 annot_str.append(self.adduct)
             if self.mz_delta is not None:
                 annot_str.append(
@@ -208,6 +349,8 @@ class FragmentAnnotation:
 
 
 class PeakInterpretation:
+    __slots__ = ("fragment_annotations",)
+
     _unknown = FragmentAnnotation("?")
 
     def __init__(self):
@@ -221,11 +364,11 @@ class PeakInterpretation:
 
     def __str__(self) -> str:
         # If no fragment annotations have been specified, interpret as an
-        # unknown ion.
-        if len(self.fragment_annotations) > 0:
-            return ",".join([str(a) for a in self.fragment_annotations])
-        else:
-            return str(self._unknown)
+        # unknown ion. The fragment annotations cache their string
+        # representations, so this does not render them again.
+        return ",".join([str(a) for a in self.fragment_annotations]) or str(
+            self._unknown
+        )
 
     def __eq__(self, other: Any) -> bool:
         return isinstance(other, PeakInterpretation) and str(self) == str(
@@ -272,207 +415,731 @@ def get_theoretical_fragments(
         All possible fragment annotations and their theoretical m/z in
         ascending m/z order.
     """
+    annotations, mzs = get_theoretical_fragments_soa(
+        proteoform, ion_types, max_charge, neutral_losses
+    )
+    return list(zip(annotations, mzs.tolist()))
+
+
+def get_theoretical_fragments_soa(
+    proteoform: proforma.Proteoform,
+    ion_types: str = "by",
+    max_charge: int = 1,
+    neutral_losses: Optional[Dict[Optional[str], float]] = None,
+) -> Tuple[List[FragmentAnnotation], np.ndarray]:
+    """
+    Get fragment annotations and their theoretical masses for the given
+    sequence as separate containers.
+
+    This is equivalent to `get_theoretical_fragments`, but the m/z values are
+    returned as a single array, which can be directly searched to match
+    observed peaks (e.g. using `np.searchsorted`).
+
+    Parameters
+    ----------
+    proteoform : proforma.Proteoform
+        The proteoform for which the fragment annotations will be generated.
+    ion_types : str
+        The ion types to generate. Can be any combination of 'a', 'b', 'c',
+        'x', 'y', and 'z' for peptide fragments, 'I' for immonium ions, 'm' for
+        internal fragment ions, 'p' for the precursor ion, and 'r' for reporter
+        ions. The default is 'by', which means that b and y peptide ions will
+        be generated.
+    max_charge : int
+        All fragments up to and including the given charge will be generated
+        (the default is 1 to only generate singly-charged fragments).
+    neutral_losses : Optional[Dict[Optional[str], float]]
+        A dictionary with neutral loss names and (negative) mass differences to
+        be considered.
+
+    Returns
+    -------
+    Tuple[List[FragmentAnnotation], np.ndarray]
+        All possible fragment annotations and their theoretical m/z, in
+        ascending m/z order.
+
+    Notes
+    -----
+    Results are cached based on the sequence, the modification positions and
+    masses, and the fragment settings. New fragment annotations are created
+    for each call, but the (read-only) m/z array is shared between calls.
+    """
+    if proteoform.modifications is None:
+        modifications = None
+    else:
+        modifications = tuple(
+            (mod.position, mod.mass) for mod in proteoform.modifications
+        )
+    fragments, mzs = _get_theoretical_fragments_cached(
+        proteoform.sequence,
+        modifications,
+        ion_types,
+        max_charge,
+        None if neutral_losses is None else tuple(neutral_losses.items()),
+    )
+    annotations = [
+        FragmentAnnotation(ion_type, neutral_loss, charge=charge)
+        for ion_type, neutral_loss, charge in fragments
+    ]
+    return annotations, mzs
+
+
+@functools.lru_cache(maxsize=_fragment_cache_size)
+def _get_theoretical_fragments_cached(
+    sequence: str,
+    modifications: Optional[Tuple[Tuple[Any, Optional[float]], ...]],
+    ion_types: str,
+    max_charge: int,
+    neutral_losses: Optional[Tuple[Tuple[Optional[str], float], ...]],
+) -> Tuple[Tuple[Tuple[str, Optional[str], int], ...], np.ndarray]:
+    """
+    Get the fragments and their theoretical masses from hashable arguments.
+
+    Parameters
+    ----------
+    sequence : str
+        The amino acid sequence.
+    modifications : Optional[Tuple[Tuple[Any, Optional[float]], ...]]
+        The position and mass of each modification.
+    ion_types : str
+        The ion types to generate.
+    max_charge : int
+        All fragments up to and including the given charge will be generated.
+    neutral_losses : Optional[Tuple[Tuple[Optional[str], float], ...]]
+        The neutral loss names and (negative) mass differences to be
+        considered.
+
+    Returns
+    -------
+    Tuple[Tuple[Tuple[str, Optional[str], int], ...], np.ndarray]
+        The ion type, neutral loss, and charge of all possible fragments and
+        their (read-only) theoretical m/z, in ascending m/z order.
+    """
+    if modifications is not None:
+        modifications = [
+            proforma.Modification(mass, position)
+            for position, mass in modifications
+        ]
+    proteoform = proforma.Proteoform(sequence, modifications)
+    if neutral_losses is not None:
+        neutral_losses = dict(neutral_losses)
+    ion_mask = _compile_ion_types(ion_types)
+    _check_sequence(proteoform.sequence)
+    # Residue masses including their localized modification masses.
+    aa_masses = residue_masses(proteoform.sequence) + _get_residue_mod_masses(
+        proteoform
+    )
+    # Calculate the theoretical masses of all peptide fragments ('a', 'b',
+    # 'c', 'x', 'y', 'z') from cumulative residue masses.
+    terminal_ion_types, ion_offsets, ion_is_nterm = _get_ion_offsets(ion_mask)
+    if (
+        ion_mask == _ion_bits["b"] | _ion_bits["y"]
+        and 1 <= max_charge <= 2
+        and neutral_losses is None
+    ):
+        # Specialized computation for the most common fragmentation settings.
+        fragments, mzs = _get_by_fragments(aa_masses, ion_offsets, max_charge)
+    else:
+        fragment_mzs = _get_terminal_fragment_mzs(
+            aa_masses,
+            ion_offsets,
+            ion_is_nterm,
+            max_charge,
+            _proton_mass,
+        )
+        fragments, mzs = _get_fragments(
+            proteoform,
+            ion_mask,
+            max_charge,
+            neutral_losses,
+            aa_masses,
+            terminal_ion_types,
+            fragment_mzs,
+        )
+    mzs.setflags(write=False)
+    return tuple(fragments), mzs
+
+
+# Expose clearing the fragment cache through the public functions.
+get_theoretical_fragments.cache_clear = (
+    _get_theoretical_fragments_cached.cache_clear
+)
+get_theoretical_fragments_soa.cache_clear = (
+    _get_theoretical_fragments_cached.cache_clear
+)
+
+
+def get_theoretical_fragments_batch(
+    proteoforms: Sequence[proforma.Proteoform],
+    ion_types: str = "by",
+    max_charge: int = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the theoretical masses of the peptide fragments of multiple
+    proteoforms.
+
+    The theoretical masses of the peptide fragments of all proteoforms are
+    computed in parallel and returned as packed arrays, without creating
+    fragment annotations.
+
+    Parameters
+    ----------
+    proteoforms : Sequence[proforma.Proteoform]
+        The proteoforms for which the fragment masses will be computed.
+    ion_types : str
+        The peptide fragment ion types to generate. Can be any combination of
+        'a', 'b', 'c', 'x', 'y', and 'z'. The default is 'by', which means that
+        b and y peptide ions will be generated.
+    max_charge : int
+        All fragments up to and including the given charge will be generated
+        (the default is 1 to only generate singly-charged fragments).
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The fragment offsets of the proteoforms and the concatenated fragment
+        m/z values. The fragment m/z values of the i'th proteoform are
+        `mzs[offsets[i]:offsets[i + 1]]`, ordered by ion type (in 'abcxyz'
+        order), charge, and fragment number.
+
+    Raises
+    ------
+    ValueError
+        If ion types other than peptide fragments are specified.
+    """
+    ion_mask = _compile_ion_types(ion_types)
+    if ion_mask & (_ion_bits["I"] | _ion_bits["m"] | _ion_bits["p"]):
+        raise ValueError(
+            "Only peptide fragment ion types ('a', 'b', 'c', 'x', 'y', 'z') "
+            "are supported for batched fragment generation"
+        )
+    if len(proteoforms) == 0:
+        return np.zeros(1, np.int64), np.empty(0, np.float64)
+    aa_masses = []
+    for proteoform in proteoforms:
+        _check_sequence(proteoform.sequence)
+        # Residue masses including their localized modification masses.
+        aa_masses.append(
+            residue_masses(proteoform.sequence)
+            + _get_residue_mod_masses(proteoform)
+        )
+    _, ion_offsets, ion_is_nterm = _get_ion_offsets(ion_mask)
+    # Concatenate the residue masses of all proteoforms and compute the
+    # offsets of each proteoform in the residue and fragment arrays.
+    lengths = np.asarray([len(p.sequence) for p in proteoforms], np.int64)
+    n_fragments = np.maximum(lengths - 1, 0)
+    residue_offsets = np.concatenate(([0], np.cumsum(lengths)))
+    fragment_offsets = np.concatenate(
+        ([0], np.cumsum(len(ion_offsets) * max_charge * n_fragments))
+    )
+    fragment_mzs = _get_terminal_fragment_mzs_batch(
+        np.concatenate(aa_masses),
+        residue_offsets,
+        fragment_offsets,
+        ion_offsets,
+        ion_is_nterm,
+        max_charge,
+        _proton_mass,
+    )
+    return fragment_offsets, fragment_mzs
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_ion_types(ion_types: str) -> int:
+    """
+    Convert the given ion types to a bit mask of the ion types for which
+    fragments can be generated.
+
+    Parameters
+    ----------
+    ion_types : str
+        The ion types to generate.
+
+    Returns
+    -------
+    int
+        The bit mask of the ion types, with bits as specified by `_ion_bits`.
+
+    Raises
+    ------
+    ValueError
+        If an unsupported ion type is specified.
+    """
+    ion_mask = 0
     for ion_type in ion_types:
         if ion_type not in _supported_ions:
             raise ValueError(
                 f"{ion_type} is not a supported ion type ({_supported_ions})"
             )
-    if "B" in proteoform.sequence:
+        ion_mask |= _ion_bits.get(ion_type, 0)
+    return ion_mask
+
+
+def _check_sequence(sequence: str) -> None:
+    """
+    Verify that fragments can be generated for the given sequence.
+
+    Parameters
+    ----------
+    sequence : str
+        The amino acid sequence.
+
+    Raises
+    ------
+    ValueError
+        If the sequence contains ambiguous amino acids.
+    """
+    if "B" in sequence:
         raise ValueError(
             "Explicitly specify aspartic acid (D) or asparagine (N) instead of"
             " the ambiguous B to compute the fragment annotations"
         )
-    if "Z" in proteoform.sequence:
+    if "Z" in sequence:
         raise ValueError(
             "Explicitly specify glutamic acid (E) or glutamine (Q) instead of "
             "the ambiguous Z to compute the fragment annotations"
         )
 
+
+@functools.lru_cache(maxsize=64)
+def _get_ion_offsets(ion_mask: int) -> Tuple[str, np.ndarray, np.ndarray]:
+    """
+    Get the mass offsets of the peptide fragment ion types in the given ion
+    type bit mask.
+
+    Parameters
+    ----------
+    ion_mask : int
+        The bit mask of the ion types to generate.
+
+    Returns
+    -------
+    Tuple[str, np.ndarray, np.ndarray]
+        The peptide fragment ion types ('a', 'b', 'c', 'x', 'y', 'z') in the
+        bit mask, their mass offsets relative to the summed residue masses, and
+        whether they are N-terminal fragments.
+    """
+    ion_codes = [
+        code
+        for code, ion_type in enumerate(_peptide_ion_types)
+        if ion_mask & _ion_bits[ion_type]
+    ]
+    ion_types = "".join(_peptide_ion_types[code] for code in ion_codes)
+    ion_codes = np.asarray(ion_codes, dtype=np.int64)
+    # The first three ion types (a, b, c) are N-terminal fragments.
+    return ion_types, _peptide_ion_offset[ion_codes], ion_codes < 3
+
+
+def _get_fragments(
+    proteoform: proforma.Proteoform,
+    ion_mask: int,
+    max_charge: int,
+    neutral_losses: Optional[Dict[Optional[str], float]],
+    aa_masses: np.ndarray,
+    terminal_ion_types: str,
+    terminal_fragment_mzs: np.ndarray,
+) -> Tuple[List[Tuple[str, Optional[str], int]], np.ndarray]:
+    """
+    Get the fragments with their theoretical masses for the given proteoform
+    from its precomputed peptide fragment masses.
+
+    Parameters
+    ----------
+    proteoform : proforma.Proteoform
+        The proteoform for which the fragment annotations will be generated.
+    ion_mask : int
+        The bit mask of the ion types to generate.
+    max_charge : int
+        All fragments up to and including the given charge will be generated.
+    neutral_losses : Optional[Dict[Optional[str], float]]
+        A dictionary with neutral loss names and (negative) mass differences to
+        be considered.
+    aa_masses : np.ndarray
+        The residue masses of the proteoform, including their localized
+        modification masses.
+    terminal_ion_types : str
+        The peptide fragment ion types for which the masses were computed.
+    terminal_fragment_mzs : np.ndarray
+        The peptide fragment m/z values indexed by ion type, charge minus one,
+        and fragment number minus one.
+
+    Returns
+    -------
+    Tuple[List[Tuple[str, Optional[str], int]], np.ndarray]
+        The ion type, neutral loss, and charge of all possible fragments and
+        their theoretical m/z, in ascending m/z order.
+    """
     neutral_losses = {None: 0} if neutral_losses is None else neutral_losses
 
-    base_fragments = []
-
-    # Generate all peptide fragments ('a', 'b', 'c', 'x', 'y', 'z') and
-    # calculate their theoretical masses.
-    # Generate all N-terminal peptide fragments.
-    for ion_type in set("abc") & set(ion_types):
-        mod_i, mod_mass = 0, 0
-        for fragment_i in range(1, len(proteoform.sequence)):
-            fragment_sequence = proteoform.sequence[:fragment_i]
-            # Ignore unlocalized modifications.
-            while (
-                proteoform.modifications is not None
-                and mod_i < len(proteoform.modifications)
-                and isinstance(proteoform.modifications[mod_i].position, str)
-                and proteoform.modifications[mod_i].position != "N-term"
-            ):
-                mod_i += 1
-            # Include prefix modifications.
-            while (
-                proteoform.modifications is not None
-                and mod_i < len(proteoform.modifications)
-                and (
-                    proteoform.modifications[mod_i].position == "N-term"
-                    or (
-                        isinstance(
-                            proteoform.modifications[mod_i].position, int
-                        )
-                        and proteoform.modifications[mod_i].position
-                        < fragment_i
-                    )
-                )
-            ):
-                mod_mass += proteoform.modifications[mod_i].mass
-                mod_i += 1
-            base_fragments.append(
-                (fragment_sequence, ion_type, fragment_i, mod_mass)
-            )
-    # Generate all C-terminal peptide fragments.
-    for ion_type in set("xyz") & set(ion_types):
-        if proteoform.modifications is not None:
-            mod_i, mod_mass = len(proteoform.modifications) - 1, 0
-        else:
-            mod_i, mod_mass = None, 0
-        for fragment_i in range(len(proteoform.sequence) - 1, 0, -1):
-            fragment_sequence = proteoform.sequence[fragment_i:]
-            # Include suffix modifications.
-            while (
-                proteoform.modifications is not None
-                and mod_i >= 0
-                and (
-                    proteoform.modifications[mod_i].position == "C-term"
-                    or (
-                        isinstance(
-                            proteoform.modifications[mod_i].position, int
-                        )
-                        and proteoform.modifications[mod_i].position
-                        >= fragment_i
-                    )
-                )
-            ):
-                mod_mass += proteoform.modifications[mod_i].mass
-                mod_i -= 1
-            base_fragments.append(
-                (
-                    fragment_sequence,
-                    ion_type,
-                    len(proteoform.sequence) - fragment_i,
-                    mod_mass,
-                )
-            )
+    fragments = []
+    for ion_type in terminal_ion_types:
+        for charge in range(1, max_charge + 1):
+            for fragment_i in range(1, len(proteoform.sequence)):
+                fragments.append((f"{ion_type}{fragment_i}", None, charge))
+    mzs = terminal_fragment_mzs.ravel().tolist()
 
     # Generate all internal fragment ions.
-    if "m" in ion_types:
+    if ion_mask & _ion_bits["m"]:
         # Skip internal fragments with start position 1, which are actually
-        # b ions.
-        for start_i in range(1, len(proteoform.sequence)):
-            mod_i_start, mod_mass = 0, 0
-            # Skip unlocalized and prefix modifications.
-            while (
-                proteoform.modifications is not None
-                and mod_i_start < len(proteoform.modifications)
-                and (
-                    isinstance(
-                        proteoform.modifications[mod_i_start].position, str
-                    )
-                    or proteoform.modifications[mod_i_start].position < start_i
-                )
-            ):
-                mod_i_start += 1
-            mod_i_stop = mod_i_start
-            # Internal fragments of only one residue are encoded as immonium
-            # ions.
-            for stop_i in range(start_i + 2, len(proteoform.sequence)):
-                fragment_sequence = proteoform.sequence[start_i:stop_i]
-                # Include internal modifications.
-                while (
-                    proteoform.modifications is not None
-                    and mod_i_stop < len(proteoform.modifications)
-                    and proteoform.modifications[mod_i_stop].position < stop_i
-                ):
-                    mod_mass += proteoform.modifications[mod_i_stop].mass
-                    mod_i_stop += 1
-                # Internal fragment mass calculation is equivalent to b ion
-                # mass calculation.
-                base_fragments.append(
-                    (
-                        fragment_sequence,
-                        "b",
-                        f"{start_i+1}:{stop_i+1}",
-                        mod_mass,
-                    )
-                )
+        # b ions. Internal fragments of only one residue are encoded as
+        # immonium ions.
+        start_i, stop_i = np.triu_indices(len(proteoform.sequence) - 1, k=2)
+        start_i, stop_i = start_i + 1, stop_i + 1
+        # Internal fragment mass calculation is equivalent to b ion mass
+        # calculation.
+        prefix_masses = np.cumsum(aa_masses)
+        charges = np.arange(1, max_charge + 1)
+        internal_mzs = (
+            (prefix_masses[stop_i - 1] - prefix_masses[start_i - 1])[
+                :, np.newaxis
+            ]
+            + _peptide_ion_offset[_peptide_ion_types.index("b")]
+            + charges * _proton_mass
+        ) / charges
+        for start, stop in zip(start_i.tolist(), stop_i.tolist()):
+            for charge in range(1, max_charge + 1):
+                fragments.append((f"m{start+1}:{stop+1}", None, charge))
+        mzs.extend(internal_mzs.ravel().tolist())
 
-    # Generate unfragmented precursor ion(s).
-    if "p" in ion_types:
+    # Generate unfragmented precursor ion(s) (using Pyteomics).
+    if ion_mask & _ion_bits["p"]:
         if proteoform.modifications is not None:
-            mod_mass = sum([mod.mass for mod in proteoform.modifications])
+            mod_mass = math.fsum(mod.mass for mod in proteoform.modifications)
         else:
             mod_mass = 0
-        base_fragments.append((proteoform.sequence, "M", "p", mod_mass))
-
-    fragments_masses = []
-    # Compute the theoretical fragment masses (using Pyteomics)
-    for fragment_sequence, ion_type, fragment_i, mod_mass in base_fragments:
         for charge in range(1, max_charge + 1):
-            annot_type = "?"
-            if isinstance(fragment_i, str):
-                if ":" in fragment_i:
-                    annot_type = f"m{fragment_i}"
-                elif fragment_i == "p":
-                    annot_type = "p"
-            else:
-                annot_type = f"{ion_type}{fragment_i}"
-            fragments_masses.append(
-                (
-                    FragmentAnnotation(ion_type=annot_type, charge=charge),
-                    pmass.fast_mass(
-                        sequence=fragment_sequence,
-                        ion_type=ion_type,
-                        charge=charge,
-                        aa_mass=_aa_mass,
-                    )
-                    + mod_mass / charge,
+            fragments.append(("p", None, charge))
+            mzs.append(
+                pmass.fast_mass(
+                    sequence=proteoform.sequence,
+                    ion_type="M",
+                    charge=charge,
+                    aa_mass=_aa_mass,
                 )
+                + mod_mass / charge
             )
 
     # Generate all immonium ions (internal single amino acid from the
     # combination of a type and y type cleavage.
-    if "I" in ion_types:
-        # Amino acid mass minus CO plus charge 1.
-        mass_diff = pmass.calculate_mass(formula="CO") - pmass.calculate_mass(
-            formula="H"
-        )
-        for aa, mass in _aa_mass.items():
-            if aa != "X":
-                fragments_masses.append(
-                    (
-                        FragmentAnnotation(ion_type=f"I{aa}", charge=1),
-                        mass - mass_diff,
-                    )
-                )
+    if ion_mask & _ion_bits["I"]:
+        for ion_type, mz in _immonium_ions:
+            fragments.append((ion_type, None, 1))
+            mzs.append(mz)
 
     # Generate all fragments that differ by a neutral loss from the base
     # fragments.
-    neutral_loss_fragments = []
+    mzs = np.asarray(mzs, dtype=np.float64)
+    neutral_loss_names, neutral_loss_diffs = [], []
     for neutral_loss, mass_diff in neutral_losses.items():
-        if neutral_loss is None:
-            continue
-        neutral_loss = f"{'-' if mass_diff < 0 else '+'}{neutral_loss}"
-        for fragment, mass in fragments_masses:
-            fragment_mass = mass + mass_diff / fragment.charge
-            if fragment_mass > 0:
-                neutral_loss_fragments.append(
-                    (
-                        FragmentAnnotation(
-                            ion_type=fragment.ion_type,
-                            neutral_loss=neutral_loss,
-                            charge=fragment.charge,
-                        ),
-                        fragment_mass,
-                    )
+        if neutral_loss is not None:
+            neutral_loss_names.append(
+                f"{'-' if mass_diff < 0 else '+'}{neutral_loss}"
+            )
+            neutral_loss_diffs.append(mass_diff)
+    if len(neutral_loss_names) > 0 and len(fragments) > 0:
+        charges = np.fromiter(
+            (charge for _, _, charge in fragments),
+            dtype=np.float64,
+            count=len(fragments),
+        )
+        # Neutral loss m/z values indexed by neutral loss and base fragment.
+        neutral_loss_mzs = (
+            mzs
+            + np.asarray(neutral_loss_diffs, dtype=np.float64)[:, np.newaxis]
+            / charges
+        )
+        valid_mz = neutral_loss_mzs > 0
+        base_fragments = fragments.copy()
+        for neutral_loss_i, fragment_i in zip(
+            *[indices.tolist() for indices in np.nonzero(valid_mz)]
+        ):
+            ion_type, _, charge = base_fragments[fragment_i]
+            fragments.append(
+                (ion_type, neutral_loss_names[neutral_loss_i], charge)
+            )
+        mzs = np.concatenate((mzs, neutral_loss_mzs[valid_mz]))
+
+    # Sort the fragments by their theoretical masses.
+    order = np.argsort(mzs, kind="stable")
+    return [fragments[i] for i in order.tolist()], mzs[order]
+
+
+def _get_by_fragments(
+    aa_masses: np.ndarray, ion_offsets: np.ndarray, max_charge: int
+) -> Tuple[List[Tuple[str, Optional[str], int]], np.ndarray]:
+    """
+    Get the b and y fragments with their theoretical masses, without neutral
+    losses.
+
+    The fragments are identical to those generated by `_get_fragments` for
+    ion types 'by'.
+
+    Parameters
+    ----------
+    aa_masses : np.ndarray
+        The residue masses of the proteoform, including their localized
+        modification masses.
+    ion_offsets : np.ndarray
+        The mass offsets of the b and y ions relative to the summed residue
+        masses.
+    max_charge : int
+        All fragments up to and including the given charge (1 or 2) will be
+        generated.
+
+    Returns
+    -------
+    Tuple[List[Tuple[str, Optional[str], int]], np.ndarray]
+        The ion type, neutral loss, and charge of all b and y fragments and
+        their theoretical m/z, in ascending m/z order.
+    """
+    mzs = _get_by_fragment_mzs(
+        aa_masses, ion_offsets, max_charge, _proton_mass
+    ).ravel()
+    fragments = [
+        (f"{ion_type}{fragment_i}", None, charge)
+        for ion_type in "by"
+        for charge in range(1, max_charge + 1)
+        for fragment_i in range(1, len(aa_masses))
+    ]
+    order = np.argsort(mzs, kind="stable")
+    return [fragments[i] for i in order.tolist()], mzs[order]
+
+
+def _get_residue_mod_masses(proteoform: proforma.Proteoform) -> np.ndarray:
+    """
+    Get the localized modification masses for each residue of the given
+    proteoform.
+
+    N-terminal and C-terminal modifications are assigned to the first and last
+    residue, respectively. Unlocalized modifications (unknown positions,
+    labile and global modifications, and modification ranges) are ignored.
+
+    Parameters
+    ----------
+    proteoform : proforma.Proteoform
+        The proteoform for which the modification masses are computed.
+
+    Returns
+    -------
+    np.ndarray
+        The total modification mass on each residue.
+
+    Raises
+    ------
+    ValueError
+        If the mass of a localized modification is unknown.
+    """
+    mod_masses = np.zeros(len(proteoform.sequence), dtype=np.float64)
+    if proteoform.modifications is not None:
+        term_positions = {"N-term": 0, "C-term": len(proteoform.sequence) - 1}
+        positions, masses = [], []
+        for mod in proteoform.modifications:
+            if isinstance(mod.position, int):
+                positions.append(mod.position)
+            elif mod.position in term_positions:
+                positions.append(term_positions[mod.position])
+            else:
+                continue
+            if mod.mass is None:
+                raise ValueError(
+                    f"Unknown mass for modification {mod} in proteoform "
+                    f"{proteoform.sequence}"
                 )
-    fragments_masses.extend(neutral_loss_fragments)
+            masses.append(mod.mass)
+        # Explicitly typed arrays, so that proteoforms without localized
+        # modifications also have integer positions and float masses.
+        np.add.at(
+            mod_masses,
+            np.asarray(positions, dtype=np.int64),
+            np.asarray(masses, dtype=np.float64),
+        )
+    return mod_masses
+
+
+def residue_masses(sequence: str) -> np.ndarray:
+    """
+    Get the masses of the amino acid residues in the given sequence.
+
+    Parameters
+    ----------
+    sequence : str
+        The amino acid sequence.
+
+    Returns
+    -------
+    np.ndarray
+        The residue masses, in the order of the sequence.
+
+    Raises
+    ------
+    ValueError
+        If the sequence contains an amino acid without a known mass.
+    """
+    aa_codes = np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)
+    if not np.all(_aa_mass_mask[aa_codes]):
+        raise ValueError(
+            f"Unknown amino acid(s) in sequence {sequence} to compute the "
+            "residue masses"
+        )
+    return _aa_mass_lut[aa_codes]
+
+
+@nb.njit(cache=True)
+def _get_terminal_fragment_mzs(
+    residue_masses: np.ndarray,
+    ion_offsets: np.ndarray,
+    ion_is_nterm: np.ndarray,
+    max_charge: int,
+    proton_mass: float,
+) -> np.ndarray:
+    """
+    Compute the theoretical m/z values of terminal peptide fragments.
 
-    # Sort the fragment annotations by their theoretical masses.
-    return sorted(fragments_masses, key=operator.itemgetter(1))
+    Parameters
+    ----------
+    residue_masses : np.ndarray
+        The residue masses of the amino acid sequence, including their
+        localized modification masses.
+    ion_offsets : np.ndarray
+        The mass offsets of the ion types relative to the summed residue
+        masses.
+    ion_is_nterm : np.ndarray
+        Whether the ion types are N-terminal (True) or C-terminal (False)
+        fragments.
+    max_charge : int
+        All fragments up to and including the given charge are computed.
+    proton_mass : float
+        The mass of a proton.
+
+    Returns
+    -------
+    np.ndarray
+        The fragment m/z values indexed by ion type, charge minus one, and
+        fragment number minus one.
+    """
+    n = len(residue_masses)
+    n_fragments = max(n - 1, 0)
+    prefix_masses = np.cumsum(residue_masses)
+    fragment_mzs = np.empty(
+        (len(ion_offsets), max_charge, n_fragments), np.float64
+    )
+    for ion_i in range(len(ion_offsets)):
+        for charge_i in range(max_charge):
+            charge = charge_i + 1
+            for fragment_i in range(n_fragments):
+                if ion_is_nterm[ion_i]:
+                    fragment_mass = prefix_masses[fragment_i]
+                else:
+                    fragment_mass = (
+                        prefix_masses[n - 1]
+                        - prefix_masses[n - 2 - fragment_i]
+                    )
+                fragment_mzs[ion_i, charge_i, fragment_i] = (
+                    fragment_mass + ion_offsets[ion_i] + charge * proton_mass
+                ) / charge
+    return fragment_mzs
+
+
+@nb.njit("f8[:, ::1](f8[::1], f8[::1], i8, f8)", cache=True)
+def _get_by_fragment_mzs(
+    residue_masses: np.ndarray,
+    ion_offsets: np.ndarray,
+    max_charge: int,
+    proton_mass: float,
+) -> np.ndarray:
+    """
+    Compute the theoretical m/z values of b and y peptide fragments.
+
+    Parameters
+    ----------
+    residue_masses : np.ndarray
+        The residue masses of the amino acid sequence, including their
+        localized modification masses.
+    ion_offsets : np.ndarray
+        The mass offsets of the b and y ions relative to the summed residue
+        masses.
+    max_charge : int
+        All fragments up to and including the given charge are computed.
+    proton_mass : float
+        The mass of a proton.
+
+    Returns
+    -------
+    np.ndarray
+        The fragment m/z values indexed by ion type and charge (b ions
+        followed by y ions, each in increasing charge), and fragment number
+        minus one.
+    """
+    n = len(residue_masses)
+    n_fragments = max(n - 1, 0)
+    prefix_masses = np.cumsum(residue_masses)
+    fragment_mzs = np.empty((2 * max_charge, n_fragments), np.float64)
+    for charge_i in range(max_charge):
+        charge = charge_i + 1
+        for fragment_i in range(n_fragments):
+            b_mass = prefix_masses[fragment_i]
+            y_mass = prefix_masses[n - 1] - prefix_masses[n - 2 - fragment_i]
+            fragment_mzs[charge_i, fragment_i] = (
+                b_mass + ion_offsets[0] + charge * proton_mass
+            ) / charge
+            fragment_mzs[max_charge + charge_i, fragment_i] = (
+                y_mass + ion_offsets[1] + charge * proton_mass
+            ) / charge
+    return fragment_mzs
+
+
+@nb.njit(parallel=True, cache=True)
+def _get_terminal_fragment_mzs_batch(
+    residue_masses: np.ndarray,
+    residue_offsets: np.ndarray,
+    fragment_offsets: np.ndarray,
+    ion_offsets: np.ndarray,
+    ion_is_nterm: np.ndarray,
+    max_charge: int,
+    proton_mass: float,
+) -> np.ndarray:
+    """
+    Compute the theoretical m/z values of terminal peptide fragments for
+    multiple sequences in parallel.
+
+    Parameters
+    ----------
+    residue_masses : np.ndarray
+        The concatenated residue masses of all amino acid sequences, including
+        their localized modification masses.
+    residue_offsets : np.ndarray
+        The start offsets of each sequence in the residue masses, followed by
+        the total number of residues.
+    fragment_offsets : np.ndarray
+        The start offsets of each sequence in the output fragment m/z values,
+        followed by the total number of fragments.
+    ion_offsets : np.ndarray
+        The mass offsets of the ion types relative to the summed residue
+        masses.
+    ion_is_nterm : np.ndarray
+        Whether the ion types are N-terminal (True) or C-terminal (False)
+        fragments.
+    max_charge : int
+        All fragments up to and including the given charge are computed.
+    proton_mass : float
+        The mass of a proton.
+
+    Returns
+    -------
+    np.ndarray
+        The concatenated fragment m/z values of all sequences. For each
+        sequence, the fragment m/z values are indexed by ion type, charge minus
+        one, and fragment number minus one in row-major order.
+    """
+    fragment_mzs = np.empty(fragment_offsets[-1], np.float64)
+    for i in nb.prange(len(residue_offsets) - 1):
+        fragment_mzs[fragment_offsets[i] : fragment_offsets[i + 1]] = (
+            _get_terminal_fragment_mzs(
+                residue_masses[residue_offsets[i] : residue_offsets[i + 1]],
+                ion_offsets,
+                ion_is_nterm,
+                max_charge,
+                proton_mass,
+            ).ravel()
+        )
+    return fragment_mzs
@@ -707,38 +707,47 @@ class MsmsSpectrum:
         # fragments.
         proteoforms = proforma.parse(self.proforma)
         analyte_number = 1 if len(proteoforms) > 1 else None
+        # Theoretical fragments within the fragment mass tolerance of each
+        # peak are bounded by these m/z values.
+        if fragment_tol_mode == "Da":
+            min_mz = self.mz - fragment_tol_mass
+            max_mz = self.mz + fragment_tol_mass
+        else:
+            min_mz = self.mz / (1 + fragment_tol_mass / 10**6)
+            max_mz = (
+                self.mz / (1 - fragment_tol_mass / 10**6)
+                if fragment_tol_mass < 10**6
+                else np.full_like(self.mz, np.inf)
+            )
         for proteoform in proteoforms:
-            fragments = fa.get_theoretical_fragments(
+            annotations, fragment_mzs = fa.get_theoretical_fragments_soa(
                 proteoform, ion_types, max_ion_charge, neutral_losses
             )
-            fragment_i = 0
+            start_i = np.searchsorted(fragment_mzs, min_mz, "left").tolist()
+            stop_i = np.searchsorted(fragment_mzs, max_mz, "right").tolist()
+            fragment_mzs = fragment_mzs.tolist()
             for peak_i, peak_mz in enumerate(self.mz):
                 pi = fa.PeakInterpretation()
-                while (
-                    fragment_i < len(fragments)
-                    and mass_diff(peak_mz, fragments[fragment_i][1])
-                    > fragment_tol_mass
-                ):
-                    fragment_i += 1
-                i = 0
-                while (
-                    fragment_i + i < len(fragments)
-                    and abs(mass_diff(peak_mz, fragments[fragment_i + i][1]))
-                    <= fragment_tol_mass
-                ):
+                for fragment_i in range(start_i[peak_i], stop_i[peak_i]):
+                    fragment_mz_delta = mass_diff(
+                        peak_mz, fragment_mzs[fragment_i]
+                    )
+                    # Exclude fragments that are only within the m/z bounds
+                    # due to rounding.
+                    if abs(fragment_mz_delta) > fragment_tol_mass:
+                        continue
                     # FIXME: Annotations should not be duplicated across
                     #   multiple peaks.
-                    fragment = copy.copy(fragments[fragment_i + i][0])
+                    fragment = copy.copy(annotations[fragment_i])
                     fragment.analyte_number = analyte_number
                     fragment.mz_delta = (
                         round(
-                            mass_diff(peak_mz, fragments[fragment_i + i][1]),
+                            fragment_mz_delta,
                             ndigits=5 if fragment_tol_mode == "Da" else 1,
                         ),
                         fragment_tol_mode,
                     )
                     pi.fragment_annotations.append(fragment)
-                    i += 1
                 self.annotation[peak_i] = pi
             if analyte_number is not None:
                 analyte_number += 1
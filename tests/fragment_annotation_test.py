@@ -1,4 +1,5 @@
 import numpy as np
+import pyteomics.mass as pmass
 import pytest
 
 from spectrum_utils import fragment_annotation, proforma
@@ -31,6 +32,73 @@ def test_fragment_annotation_primary():
         fragment_annotation.FragmentAnnotation("b5", charge=-2)
 
 
+def test_fragment_annotation_str():
+    annotation = fragment_annotation.FragmentAnnotation(
+        "y4", neutral_loss="-H2O", isotope=1, charge=2
+    )
+    assert str(annotation) == "y4-H2O+i^2"
+    annotation.analyte_number = 1
+    annotation.mz_delta = (-0.00051, "Da")
+    assert str(annotation) == "1@y4-H2O+i^2/-0.00051"
+    annotation.charge = 1
+    assert str(annotation) == "1@y4-H2O+i/-0.00051"
+    assert annotation == fragment_annotation.FragmentAnnotation(
+        "y4",
+        neutral_loss="-H2O",
+        isotope=1,
+        charge=1,
+        analyte_number=1,
+        mz_delta=(-0.00051, "Da"),
+    )
+    annotation.ion_type = "b3"
+    annotation.neutral_loss = "-NH3"
+    annotation.isotope = 0
+    annotation.adduct = "[M+Na]"
+    assert str(annotation) == "1@b3-NH3[M+Na]/-0.00051"
+    assert annotation != fragment_annotation.FragmentAnnotation(
+        "y4",
+        neutral_loss="-H2O",
+        isotope=1,
+        charge=1,
+        analyte_number=1,
+        mz_delta=(-0.00051, "Da"),
+    )
+
+
+def test_peak_interpretation_str():
+    peak_interpretation = fragment_annotation.PeakInterpretation()
+    assert str(peak_interpretation) == "?"
+    assert str(peak_interpretation[0]) == "?"
+    peak_interpretation.fragment_annotations.append(
+        fragment_annotation.FragmentAnnotation("b3", charge=1)
+    )
+    peak_interpretation.fragment_annotations.append(
+        fragment_annotation.FragmentAnnotation(
+            "y2", neutral_loss="-NH3", charge=2
+        )
+    )
+    assert str(peak_interpretation) == "b3,y2-NH3^2"
+    assert str(peak_interpretation[1]) == "y2-NH3^2"
+
+
+def test_residue_masses():
+    np.testing.assert_allclose(
+        fragment_annotation.residue_masses("HPYLEDRX"),
+        [
+            pmass.std_aa_mass["H"],
+            pmass.std_aa_mass["P"],
+            pmass.std_aa_mass["Y"],
+            pmass.std_aa_mass["L"],
+            pmass.std_aa_mass["E"],
+            pmass.std_aa_mass["D"],
+            pmass.std_aa_mass["R"],
+            0,
+        ],
+    )
+    with pytest.raises(ValueError):
+        fragment_annotation.residue_masses("HPYLEBDR")
+
+
 def test_get_theoretical_fragments():
     peptide = proforma.parse("HPYLEDR")[0]
     fragments = {
@@ -80,6 +148,53 @@ def test_get_theoretical_fragments():
         )
 
 
+def test_get_theoretical_fragments_ion_types():
+    peptide = proforma.parse("[+42.01056]-HPY[+79.96633]LEDR")[0]
+    for (
+        annotation,
+        fragment_mz,
+    ) in fragment_annotation.get_theoretical_fragments(
+        peptide, "abcxyz", max_charge=2
+    ):
+        ion_type = annotation.ion_type[0]
+        fragment_i = int(annotation.ion_type[1:])
+        if ion_type in "abc":
+            fragment_sequence = peptide.sequence[:fragment_i]
+            mod_mass = 42.01056 + (79.96633 if fragment_i > 2 else 0)
+        else:
+            fragment_sequence = peptide.sequence[-fragment_i:]
+            mod_mass = 79.96633 if fragment_i > 4 else 0
+        assert fragment_mz == pytest.approx(
+            pmass.fast_mass(
+                fragment_sequence, ion_type=ion_type, charge=annotation.charge
+            )
+            + mod_mass / annotation.charge
+        )
+    # Empty sequences only have precursor ions.
+    fragments = fragment_annotation.get_theoretical_fragments(
+        proforma.Proteoform(""), "abcxyzp", max_charge=2
+    )
+    assert [str(annotation) for annotation, _ in fragments] == ["p^2", "p"]
+
+
+def test_get_theoretical_fragments_internal():
+    peptide = proforma.parse("[+42.01056]-HPY[+79.96633]LEDR-[-0.98402]")[0]
+    fragments = fragment_annotation.get_theoretical_fragments(
+        peptide, "m", max_charge=2
+    )
+    assert len(fragments) == 2 * 10
+    for annotation, fragment_mz in fragments:
+        start_i, stop_i = map(int, annotation.ion_type[1:].split(":"))
+        fragment_sequence = peptide.sequence[start_i - 1 : stop_i - 1]
+        mod_mass = 79.96633 if start_i - 1 <= 2 < stop_i - 1 else 0
+        assert fragment_mz == pytest.approx(
+            pmass.fast_mass(
+                fragment_sequence, ion_type="b", charge=annotation.charge
+            )
+            + mod_mass / annotation.charge
+        )
+
+
 def test_get_theoretical_fragments_static_mod():
     peptide = proforma.parse("<[+79.96633]@Y>HPYLEDR")[0]
     fragments = {
@@ -228,6 +343,30 @@ def test_get_theoretical_fragments_mod_multiple():
         )
 
 
+def test_get_theoretical_fragments_mod_unlocalized():
+    fragments = fragment_annotation.get_theoretical_fragments(
+        proforma.parse("HPYLEDR")[0], "abcxyzm", max_charge=2
+    )
+    for peptide in ["[+79.96633]?HPYLEDR", "{+79.96633}HPYLEDR"]:
+        fragments_unlocalized = fragment_annotation.get_theoretical_fragments(
+            proforma.parse(peptide)[0], "abcxyzm", max_charge=2
+        )
+        assert [str(annotation) for annotation, _ in fragments] == [
+            str(annotation) for annotation, _ in fragments_unlocalized
+        ]
+        assert [mz for _, mz in fragments] == pytest.approx(
+            [mz for _, mz in fragments_unlocalized]
+        )
+
+
+def test_get_theoretical_fragments_mod_unknown_mass():
+    peptide = proforma.Proteoform(
+        "HPYLEDR", modifications=[proforma.Modification(position=2)]
+    )
+    with pytest.raises(ValueError):
+        fragment_annotation.get_theoretical_fragments(peptide)
+
+
 def test_get_theoretical_fragments_neutral_loss():
     peptide = proforma.parse("HPYLEDR")[0]
     fragments = {
@@ -356,6 +495,154 @@ def test_get_theoretical_fragments_mod_neutral_loss():
         )
 
 
+def test_get_theoretical_fragments_soa():
+    peptide = proforma.parse("[+42.01056]-HPY[+79.96633]LEDR")[0]
+    annotations, mzs = fragment_annotation.get_theoretical_fragments_soa(
+        peptide, "abcxyzIpm", max_charge=3, neutral_losses={"H2O": -18.010565}
+    )
+    fragments = fragment_annotation.get_theoretical_fragments(
+        peptide, "abcxyzIpm", max_charge=3, neutral_losses={"H2O": -18.010565}
+    )
+    assert isinstance(mzs, np.ndarray)
+    assert np.all(np.diff(mzs) >= 0)
+    assert annotations == [annotation for annotation, _ in fragments]
+    np.testing.assert_array_equal(mzs, [mz for _, mz in fragments])
+
+
+@pytest.mark.skipif(
+    fragment_annotation._fragment_cache_size == 0,
+    reason="Fragment caching is disabled",
+)
+def test_get_theoretical_fragments_cache():
+    fragment_annotation.get_theoretical_fragments.cache_clear()
+    peptide = proforma.parse("[+42.01056]-HPY[+79.96633]LEDR")[0]
+    fragments1 = fragment_annotation.get_theoretical_fragments(
+        peptide, "by", max_charge=2
+    )
+    fragments2 = fragment_annotation.get_theoretical_fragments(
+        proforma.parse("[+42.01056]-HPY[+79.96633]LEDR")[0],
+        "by",
+        max_charge=2,
+    )
+    assert fragments1 == fragments2
+    # Fragment annotations aren't shared between results.
+    assert fragments1[0][0] is not fragments2[0][0]
+    fragments2[0][0].charge = 3
+    fragments2[0][0].mz_delta = (0.5, "Da")
+    fragments_new = fragment_annotation.get_theoretical_fragments(
+        peptide, "by", max_charge=2
+    )
+    assert fragments_new == fragments1
+    # Different modifications or settings don't share cached results.
+    fragments_unmod = fragment_annotation.get_theoretical_fragments(
+        proforma.parse("HPYLEDR")[0], "by", max_charge=2
+    )
+    assert [mz for _, mz in fragments_unmod] != [mz for _, mz in fragments1]
+    fragments_loss = fragment_annotation.get_theoretical_fragments(
+        peptide, "by", max_charge=2, neutral_losses={"H2O": -18.010565}
+    )
+    assert len(fragments_loss) == 2 * len(fragments1)
+    # Cached m/z values can't be modified.
+    _, mzs = fragment_annotation.get_theoretical_fragments_soa(
+        peptide, "by", max_charge=2
+    )
+    with pytest.raises(ValueError):
+        mzs[0] = 0
+    assert (
+        fragment_annotation.get_theoretical_fragments_soa(
+            peptide, "by", max_charge=2
+        )[1]
+        is mzs
+    )
+    fragment_annotation.get_theoretical_fragments.cache_clear()
+    assert (
+        fragment_annotation.get_theoretical_fragments_soa(
+            peptide, "by", max_charge=2
+        )[1]
+        is not mzs
+    )
+    fragments3 = fragment_annotation.get_theoretical_fragments(
+        peptide, "by", max_charge=2
+    )
+    assert fragments3 == fragments1
+    assert fragments3[0][0] is not fragments1[0][0]
+
+
+def test_get_theoretical_fragments_by():
+    for peptide_str in [
+        "K",
+        "HPYLEDR",
+        "[+42.01056]-HPY[+79.96633]LEDR-[-0.98402]",
+        "AC[+57.02146]DEFGHIKLMNPQRSTVWY",
+    ]:
+        peptide = proforma.parse(peptide_str)[0]
+        for max_charge in (1, 2):
+            fragments = fragment_annotation.get_theoretical_fragments(
+                peptide, "by", max_charge=max_charge
+            )
+            # An explicit empty neutral loss uses the generic computation.
+            fragments_generic = fragment_annotation.get_theoretical_fragments(
+                peptide, "by", max_charge=max_charge, neutral_losses={None: 0}
+            )
+            assert len(fragments) == (
+                2 * max_charge * (len(peptide.sequence) - 1)
+            )
+            assert fragments == fragments_generic
+    # Fragment annotations aren't shared between peptides of the same length.
+    annotation = fragment_annotation.get_theoretical_fragments(
+        proforma.parse("PEPTIDEK")[0]
+    )[0][0]
+    annotation.analyte_number = 2
+    annotation.mz_delta = (0.5, "Da")
+    fragments = fragment_annotation.get_theoretical_fragments(
+        proforma.parse("ACDEFGHK")[0]
+    )
+    assert str(fragments[0][0]) == "b1"
+
+
+def test_get_theoretical_fragments_batch():
+    peptides = [
+        proforma.parse(peptide)[0]
+        for peptide in [
+            "HPYLEDR",
+            "[+42.01056]-HPY[+79.96633]LEDR",
+            "K",
+            "AC[+57.02146]DEFGHIKLMNPQRSTVWY",
+        ]
+    ]
+    offsets, mzs = fragment_annotation.get_theoretical_fragments_batch(
+        peptides, "yab", max_charge=2
+    )
+    assert len(offsets) == len(peptides) + 1
+    assert offsets[-1] == len(mzs)
+    for i, peptide in enumerate(peptides):
+        fragments_single = {
+            str(annotation): mz
+            for annotation, mz in fragment_annotation.get_theoretical_fragments(
+                peptide, "aby", max_charge=2
+            )
+        }
+        annotations = [
+            f"{ion_type}{fragment_i}{'' if charge == 1 else f'^{charge}'}"
+            for ion_type in "aby"
+            for charge in range(1, 3)
+            for fragment_i in range(1, len(peptide.sequence))
+        ]
+        assert offsets[i + 1] - offsets[i] == len(fragments_single)
+        assert mzs[offsets[i] : offsets[i + 1]].tolist() == pytest.approx(
+            [fragments_single[annotation] for annotation in annotations]
+        )
+    offsets, mzs = fragment_annotation.get_theoretical_fragments_batch([])
+    assert offsets.tolist() == [0]
+    assert len(mzs) == 0
+    with pytest.raises(ValueError):
+        fragment_annotation.get_theoretical_fragments_batch(peptides, "byp")
+    with pytest.raises(ValueError):
+        fragment_annotation.get_theoretical_fragments_batch(
+            [peptides[0], proforma.parse("HPYLEBDR")[0]]
+        )
+
+
 def test_get_theoretical_fragments_ambiguous():
     with pytest.raises(ValueError):
         fragment_annotation.get_theoretical_fragments(